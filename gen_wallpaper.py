@@ -2,10 +2,18 @@ from PIL import Image, ImageFilter, ImageEnhance
 from colorthief import ColorThief
 import requests
 from io import BytesIO
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, BinaryIO
 from requests.models import Response
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import pandas as pd
+import zipfile
+import logging
 import os
+import profiling
+
+# Most wallpapers in a single bulk ZIP. The app has to hold the whole ZIP in memory to serve it,
+# so this is what bounds the memory used by a bulk download
+MAX_BULK_WALLPAPERS = 20
 
 
 def get_colour_palette(res: Response) -> List[Tuple[int]]:
@@ -164,16 +172,14 @@ def get_adapted_logo_coords(alignment: str, art_dim: Tuple, wallpaper_dim: Tuple
     return (art_x, art_y)
 
 
-def wallpaper_gen(art_info: Dict) -> str:
+def render_wallpaper(art_info: Dict) -> Image.Image:
+    """Render the wallpaper described by `art_info` and return it as an in-memory image.
+    """
     WALLPAPER_DIM = (1920, 1080)
     ART_COORD = (500, -100)
     # FACTION_COORD = (-200, -75)
     FACTION_COORD = (0, 15)
 
-    # Set up the file name and save path
-    wallpaper_name = f"{art_info['Name']}.png"
-    wallpaper_path = os.path.join(os.getcwd(), wallpaper_name)
-
     # Request the operator art
     char_art = prepare_char_art(art_info["Url"])
     faction_art = prepare_faction_art(art_info["FactionLogo"])
@@ -211,11 +217,109 @@ def wallpaper_gen(art_info: Dict) -> str:
     # Now paste the actual operator art
     wallpaper.paste(char_art, ART_COORD, mask=char_art)
 
+    return wallpaper
+
+
+@profiling.profiled("wallpaper_gen")
+def wallpaper_gen(art_info: Dict) -> str:
+    # Set up the file name and save path
+    wallpaper_name = f"{art_info['Name']}.png"
+    wallpaper_path = os.path.join(os.getcwd(), wallpaper_name)
+
     # Finally save the result
+    wallpaper = render_wallpaper(art_info)
     wallpaper.save(wallpaper_path)
 
     return wallpaper_name
 
 
+def get_art_urls(char_data: pd.DataFrame, art_kinds: List[str]) -> Dict[str, str]:
+    """Map each art of a character (e.g. "Ascension 3" or "Skin2") to its URL, for the chosen kinds of art only.
+    """
+    char_info = char_data.to_dict("records")[0]
+    art_urls = dict()
+    if "Ascension 0" in art_kinds:
+        art_urls["Ascension 0"] = char_info["Ascension0"]
+    # Not every character has an Asc. 3 art
+    if ("Ascension 3" in art_kinds) and pd.notna(char_info["Ascension3"]):
+        art_urls["Ascension 3"] = char_info["Ascension3"]
+    if "Skins" in art_kinds:
+        for skin_info in char_data.dropna(subset=["SkinUrl"]).to_dict("records"):
+            art_urls[skin_info["Skin"]] = skin_info["SkinUrl"]
+
+    return art_urls
+
+
+def zip_entry_name(art_info: Dict) -> str:
+    """Build the file name of a wallpaper inside a bulk ZIP, e.g. "Alice - Ascension 3 - Right.png".
+    """
+    parts = [art_info["Name"], art_info.get("Art"), art_info["CharAlign"]]
+    return " - ".join(str(part) for part in parts if part) + ".png"
+
+
+@profiling.profiled("render_wallpaper_png")
+def render_wallpaper_png(art_info: Dict) -> bytes:
+    """Render a wallpaper and encode it as PNG bytes, without touching the disk.
+    """
+    wallpaper = render_wallpaper(art_info)
+    png_bytes = BytesIO()
+    wallpaper.save(png_bytes, format="PNG")
+    return png_bytes.getvalue()
+
+
+def wallpaper_zip_gen(arts_info: List[Dict], zip_file: BinaryIO, max_workers: int = 4) -> List[str]:
+    """Render several wallpapers in parallel and stream each one into a ZIP archive as soon as it is done.
+
+    Args:
+        arts_info (List[Dict]): one `art_info` dictionary per wallpaper, as used by `wallpaper_gen`.
+        zip_file (BinaryIO): writable file object the ZIP archive is written to.
+        max_workers (int): number of wallpapers rendered at the same time. It also caps how many\
+            rendered images are held in memory at once.
+
+    Returns:
+        List[str]: names of the wallpapers that failed to render (they are left out of the archive).
+    """
+    failed = list()
+    # Keep track of the entry names so two identical selections don't overwrite each other
+    used_names = set()
+    pending = dict()
+    arts_iter = iter(arts_info)
+
+    # PNGs are already compressed, so just store them in the archive
+    with zipfile.ZipFile(zip_file, mode="w", compression=zipfile.ZIP_STORED) as archive, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            # Only submit new renders while there are free workers, so the amount of finished\
+            # but not yet written images never grows beyond the number of workers
+            for art_info in arts_iter:
+                pending[executor.submit(render_wallpaper_png, art_info)] = art_info
+                if len(pending) >= max_workers:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                art_info = pending.pop(future)
+                entry_name = zip_entry_name(art_info)
+                try:
+                    png_bytes = future.result()
+                except Exception:
+                    logging.exception(f"Could not render {entry_name} ({art_info['Url']})")
+                    failed.append(entry_name)
+                    continue
+
+                # Add a counter to repeated names
+                base_name, counter = entry_name[:-len(".png")], 2
+                while entry_name in used_names:
+                    entry_name = f"{base_name} ({counter}).png"
+                    counter += 1
+                used_names.add(entry_name)
+
+                archive.writestr(entry_name, png_bytes)
+
+    return failed
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
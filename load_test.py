@@ -0,0 +1,306 @@
+import argparse
+import base64
+import datetime
+import hashlib
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from multiprocessing import get_context
+from typing import Dict, List, Tuple
+import pandas as pd
+import requests
+from PIL import Image, ImageDraw
+try:
+    # Not available on Windows, where peak memory is not reported
+    import resource
+except ImportError:
+    resource = None
+
+# Host of the wiki images, which is redirected to the local stand-in during the test
+CDN_URL = "https://static.wikia.nocookie.net"
+# How users tend to pick the options in the app
+ALIGN_WEIGHTS = {"Right": 0.6, "Left": 0.25, "Centred": 0.15}
+CUSTOM_COLOUR_CHANCE = 0.3
+RENDER_FACTION_CHANCE = 0.5
+# Sizes of the generated operator art, so every alignment branch gets exercised
+FIXTURE_ART_SIZES = [(700, 1000), (1100, 1250), (1400, 1400), (1800, 1600)]
+FIXTURE_LOGO_SIZE = (400, 400)
+
+
+def gen_fixture_png(size: Tuple[int, int], seed: int) -> bytes:
+    """Generate a stand-in for an operator art or faction logo: noisy colours (so the PNG is about as\
+    heavy as the real art) inside an opaque ellipse on a transparent background.
+    """
+    rng = random.Random(seed)
+    channels = [Image.effect_noise(size, 64).point(lambda p, shift=rng.randint(-96, 96): p + shift) for _ in range(3)]
+    alpha = Image.new("L", size, color=0)
+    ImageDraw.Draw(alpha).ellipse([(0, 0), size], fill=255)
+    img = Image.merge("RGBA", channels + [alpha])
+
+    png_bytes = BytesIO()
+    img.save(png_bytes, format="PNG")
+    return png_bytes.getvalue()
+
+
+def load_fixtures(fixtures_dir: str = None) -> Dict[str, List[bytes]]:
+    """Load the PNGs served by the local CDN: from a folder if given (files with "Logo" in the name are\
+    used as faction logos), otherwise generated on the fly.
+    """
+    if fixtures_dir is None:
+        return {
+            "art": [gen_fixture_png(size, seed) for seed, size in enumerate(FIXTURE_ART_SIZES)],
+            "logo": [gen_fixture_png(FIXTURE_LOGO_SIZE, len(FIXTURE_ART_SIZES))]
+        }
+
+    fixtures = {"art": list(), "logo": list()}
+    for file_name in sorted(os.listdir(fixtures_dir)):
+        if not file_name.lower().endswith(".png"):
+            continue
+        with open(os.path.join(fixtures_dir, file_name), "rb") as f:
+            fixtures["logo" if "logo" in file_name.lower() else "art"].append(f.read())
+    # Fall back on the art if there are no logos, and vice versa
+    fixtures["art"] = fixtures["art"] or fixtures["logo"]
+    fixtures["logo"] = fixtures["logo"] or fixtures["art"]
+    if not fixtures["art"]:
+        raise ValueError(f"No PNG files found in {fixtures_dir}")
+    return fixtures
+
+
+def start_cdn(fixtures: Dict[str, List[bytes]], latency: float, bandwidth: float) -> ThreadingHTTPServer:
+    """Start a local HTTP server, in a background thread, that stands in for the wiki image CDN.
+
+    Args:
+        fixtures (Dict[str, List[bytes]]): PNGs to serve, from `load_fixtures`.
+        latency (float): seconds to wait before answering each request.
+        bandwidth (float): KB/s sent per connection (0 for no limit).
+
+    Returns:
+        ThreadingHTTPServer: the running server (its port is in `server_address`).
+    """
+    chunk_size = 16 * 1024
+
+    class CDNHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            # Always serve the same fixture for the same URL
+            kind = "logo" if "_Logo" in self.path else "art"
+            url_hash = int(hashlib.md5(self.path.encode()).hexdigest(), 16)
+            body = fixtures[kind][url_hash % len(fixtures[kind])]
+
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            for start in range(0, len(body), chunk_size):
+                chunk = body[start:start + chunk_size]
+                self.wfile.write(chunk)
+                if bandwidth > 0:
+                    time.sleep(len(chunk) / (bandwidth * 1024))
+
+        def log_message(self, *args):
+            # Don't flood the output with one line per request
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CDNHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def redirect_cdn(local_url: str) -> None:
+    """Send every request for the wiki CDN to the local server instead, and refuse any other request\
+    so the test runs fully offline.
+    """
+    original_request = requests.sessions.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(CDN_URL):
+            url = local_url + url[len(CDN_URL):]
+        elif not url.startswith(local_url):
+            raise requests.ConnectionError(f"The load test runs offline, refusing to request {url}")
+        return original_request(self, method, url, *args, **kwargs)
+
+    requests.sessions.Session.request = request
+    # Make sure no proxy gets in the way of the local server
+    os.environ["NO_PROXY"] = "127.0.0.1,localhost"
+
+
+def load_art_choices() -> List[Dict]:
+    """Build the list of arts a user can pick in the app (every Asc. 0, Asc. 3 and skin art), from data.csv.
+    """
+    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "data", "data.csv")
+    data = pd.read_csv(csv_path)
+
+    art_choices = list()
+    for char_name, char_data in data.groupby("Name"):
+        char_info = char_data.to_dict("records")[0]
+        art_urls = [char_info["Ascension0"], char_info["Ascension3"]] + char_data["SkinUrl"].tolist()
+        for art_url in art_urls:
+            if pd.isna(art_url):
+                continue
+            art_choices.append({
+                "Name": char_name,
+                "Url": art_url,
+                "FactionLogo": char_info["FactionLogo"],
+                "BaseColour": char_info["BaseColour"]
+            })
+
+    return art_choices
+
+
+def random_art_info(rng: random.Random, art_choices: List[Dict]) -> Dict:
+    """Simulate the choices of a user in the app.
+    """
+    art_info = dict(rng.choice(art_choices))
+    if rng.random() < CUSTOM_COLOUR_CHANCE:
+        art_info["Colour"] = f"#{rng.randint(0, 0xFFFFFF):06x}"
+    else:
+        art_info["Colour"] = art_info["BaseColour"]
+    art_info["CharAlign"] = rng.choices(list(ALIGN_WEIGHTS), weights=list(ALIGN_WEIGHTS.values()))[0]
+    art_info["RenderFaction"] = rng.random() < RENDER_FACTION_CHANCE
+    return art_info
+
+
+def render(art_info: Dict, target: str) -> None:
+    import gen_wallpaper
+
+    wallpaper_name = gen_wallpaper.wallpaper_gen(art_info)
+    if target == "app":
+        # Same steps as the app after the render: encode the download link, then delete the file
+        with open(wallpaper_name, "rb") as f:
+            base64.b64encode(f.read()).decode()
+    os.remove(wallpaper_name)
+
+
+def run_level(local_url: str, art_choices: List[Dict], users: int, renders_per_user: int, target: str, seed: int) -> Dict:
+    """Run a single concurrency level: `users` threads, each rendering `renders_per_user` wallpapers\
+    back to back. Meant to run in its own process, so the peak memory is that of this level alone.
+    Threads are used because that's how Streamlit serves concurrent sessions.
+    """
+    redirect_cdn(local_url)
+    latencies = list()
+    errors = list()
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(users)
+
+    def user(user_id: int) -> None:
+        rng = random.Random(seed * 100003 + user_id)
+        start_barrier.wait()
+        for _ in range(renders_per_user):
+            art_info = random_art_info(rng, art_choices)
+            start = time.perf_counter()
+            try:
+                render(art_info, target)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=user, args=(user_id,)) for user_id in range(users)]
+    # The renders save files to the working directory, so keep them out of the repository
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="load_test_") as work_dir:
+        os.chdir(work_dir)
+        try:
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            # Leave the folder before it gets removed
+            os.chdir(original_cwd)
+
+    peak_rss_mb = None
+    if resource is not None:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        peak_rss_mb = peak_rss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+    return {
+        "latencies": latencies,
+        "errors": errors,
+        "elapsed": elapsed,
+        "peak_rss_mb": peak_rss_mb
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values.
+    """
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(values)), 1) - 1
+    return values[rank]
+
+
+def summarise(users: int, result: Dict) -> Dict:
+    latencies = result["latencies"]
+    total = len(latencies) + len(result["errors"])
+    return {
+        "Users": users,
+        "Renders": total,
+        "Throughput (/s)": len(latencies) / result["elapsed"],
+        "p50 (s)": percentile(latencies, 50),
+        "p95 (s)": percentile(latencies, 95),
+        "p99 (s)": percentile(latencies, 99),
+        "Error rate": len(result["errors"]) / total if total else 0,
+        "Peak RSS (MB)": result["peak_rss_mb"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the wallpaper renders offline, against a local stand-in for the wiki image CDN."
+    )
+    parser.add_argument("--levels", default="1,2,4,8", help="comma-separated numbers of concurrent users")
+    parser.add_argument("--renders-per-user", type=int, default=5, help="wallpapers rendered by each user")
+    parser.add_argument("--target", choices=["gen", "app"], default="app",
+        help="'gen' times wallpaper_gen alone, 'app' also the app's download link encoding")
+    parser.add_argument("--latency", type=float, default=0.05, help="CDN latency per request, in seconds")
+    parser.add_argument("--bandwidth", type=float, default=0, help="CDN bandwidth per connection, in KB/s (0 for no limit)")
+    parser.add_argument("--fixtures", default=None, help="folder with PNGs to serve instead of generated ones")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulated user choices")
+    parser.add_argument("--output", default=None, help="optional CSV file to save the results to")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    art_choices = load_art_choices()
+
+    print(f"{datetime.datetime.now()}: Preparing the CDN fixtures")
+    cdn = start_cdn(load_fixtures(args.fixtures), args.latency, args.bandwidth)
+    local_url = f"http://127.0.0.1:{cdn.server_address[1]}"
+
+    results = list()
+    for users in levels:
+        print(f"{datetime.datetime.now()}: Running {users} concurrent users")
+        # A fresh process per level, so the peak memory of a level doesn't carry over to the next
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(
+                run_level, local_url, art_choices, users, args.renders_per_user, args.target, args.seed
+            ).result()
+        for error in sorted(set(result["errors"])):
+            print(f"    {error}")
+        results.append(summarise(users, result))
+
+    cdn.shutdown()
+
+    df = pd.DataFrame(results)
+    print(df.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    if args.output:
+        df.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,10 +1,12 @@
 import base64
 import streamlit as st
 import gen_wallpaper
+import profiling
 import pandas as pd
 import numpy as np
 import json
 import os
+import tempfile
 st.set_option("deprecation.showfileUploaderEncoding", False)
 
 st.markdown("""
@@ -44,6 +46,11 @@ def encode_img_to_b64(img_name: str) -> bytes:
     return encoded_img
 
 
+# Admins can profile the render of this page with "?profile=<token>"
+profile_token = st.experimental_get_query_params().get("profile", [None])[0]
+if profile_token:
+    profiling.request_profile(profile_token)
+
 # Load the main DF with all art data
 main_data = load_data()
 
@@ -129,4 +136,66 @@ os.remove(wallpaper_name)
 try:
     os.remove(wallpaper_name)
 except:
-    pass
\ No newline at end of file
+    pass
+
+# Bulk mode: render several wallpapers at once and download them as a single ZIP
+with st.expander("Bulk download"):
+    bulk_chars = st.multiselect(
+        "Choose the characters",
+        np.unique(main_data["Name"].to_numpy())
+    )
+    bulk_arts = st.multiselect(
+        "Choose the kinds of art",
+        ["Ascension 0", "Ascension 3", "Skins"],
+        default=["Ascension 0"]
+    )
+    bulk_aligns = st.multiselect(
+        "Choose the alignments",
+        ["Right", "Left", "Centred"],
+        default=["Right"]
+    )
+    bulk_render_faction = st.checkbox("Include the faction logos?", key="bulk_render_faction")
+
+    # One wallpaper for each character, art and alignment combination
+    bulk_arts_info = list()
+    for char in bulk_chars:
+        char_data = main_data[main_data["Name"] == char]
+        char_info = char_data.to_dict("records")[0]
+        for art, art_url in gen_wallpaper.get_art_urls(char_data, bulk_arts).items():
+            for align in bulk_aligns:
+                bulk_arts_info.append({
+                    "Name": char_info["Name"],
+                    "Art": art,
+                    "Url": art_url,
+                    "Colour": char_info["BaseColour"],
+                    "FactionLogo": char_info["FactionLogo"],
+                    "RenderFaction": bulk_render_faction,
+                    "BaseColour": char_info["BaseColour"],
+                    "CharAlign": align
+                })
+
+    # The download button needs the whole ZIP as bytes (and keeps its own copy of them), so the\
+    # number of wallpapers is what bounds the memory: at most MAX_BULK_WALLPAPERS PNGs, held twice.\
+    # This version of Streamlit can't disable buttons, so the button is hidden over the limit
+    if len(bulk_arts_info) > gen_wallpaper.MAX_BULK_WALLPAPERS:
+        st.warning(
+            f"That's {len(bulk_arts_info)} wallpapers, but at most {gen_wallpaper.MAX_BULK_WALLPAPERS} "
+            "can be downloaded at once. Please choose fewer characters, arts or alignments."
+        )
+    # Only render once asked to, otherwise every change to the selection would rerun all the renders
+    elif st.button(f"Create ZIP with {len(bulk_arts_info)} wallpapers") and bulk_arts_info:
+        # The ZIP is written to a temporary file as the renders finish, so only a few images\
+        # are held in memory while rendering
+        with tempfile.TemporaryFile() as zip_file:
+            with st.spinner("Creating the wallpapers..."):
+                failed = gen_wallpaper.wallpaper_zip_gen(bulk_arts_info, zip_file)
+            if failed:
+                st.warning(f"Could not create these wallpapers: {', '.join(failed)}")
+
+            zip_file.seek(0)
+            st.download_button(
+                "Download the wallpapers",
+                data=zip_file.read(),
+                file_name="alchemy-stars-wallpapers.zip",
+                mime="application/zip"
+            )
\ No newline at end of file
@@ -0,0 +1,195 @@
+import cProfile
+import pstats
+import datetime
+import functools
+import hmac
+import threading
+import logging
+import os
+from typing import Callable, List, Tuple
+
+
+def _read_profile_every() -> int:
+    """Read WALLPAPER_PROFILE_EVERY, falling back on 10 if it's not a number, so a typo can't stop the app from starting.
+    """
+    value = os.environ.get("WALLPAPER_PROFILE_EVERY", "10")
+    try:
+        return max(int(value), 1)
+    except ValueError:
+        logging.warning(f"{datetime.datetime.now()}: WALLPAPER_PROFILE_EVERY={value!r} is not a number, using 10")
+        return 10
+
+
+# Profiling is opt-in: when WALLPAPER_PROFILE is set, sample every Nth call of the wrapped\
+# functions (or every call, for those wrapped with `sample=False`)
+PROFILE_ENABLED = os.environ.get("WALLPAPER_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_EVERY = _read_profile_every()
+PROFILE_DIR = os.environ.get("WALLPAPER_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+# Token to pass as the "profile" query parameter of the app to profile the next render on demand
+PROFILE_TOKEN = os.environ.get("WALLPAPER_PROFILE_TOKEN")
+# Limits on the flamegraph stacks, so building them stays fast even for large call graphs
+MIN_STACK_SHARE = 0.0001
+MAX_STACK_DEPTH = 100
+MAX_STACKS = 20000
+
+_lock = threading.Lock()
+_call_counts = dict()
+_forced_calls = 0
+
+
+def request_profile(token: str) -> bool:
+    """Profile the next call of a wrapped function, if the admin token is right.
+    The request is not tied to a session: it is used up by whichever wrapped call runs next,\
+    which may be another user's render or a bulk render in a worker thread.
+
+    Args:
+        token (str): token given by the user, compared against WALLPAPER_PROFILE_TOKEN.
+
+    Returns:
+        bool: whether the profiling was requested.
+    """
+    global _forced_calls
+    if (not PROFILE_TOKEN) or (not hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())):
+        return False
+
+    with _lock:
+        _forced_calls += 1
+    return True
+
+
+def _should_profile(name: str, sample: bool) -> bool:
+    global _forced_calls
+    with _lock:
+        if _forced_calls > 0:
+            _forced_calls -= 1
+            return True
+        if not PROFILE_ENABLED:
+            return False
+        if not sample:
+            return True
+        _call_counts[name] = _call_counts.get(name, 0) + 1
+        return _call_counts[name] % PROFILE_EVERY == 0
+
+
+def _frame_name(func: Tuple) -> str:
+    file_name, line, func_name = func
+    # Semicolons separate frames in the collapsed format
+    return f"{func_name} ({os.path.basename(file_name)}:{line})".replace(";", ",")
+
+
+def collapse_stats(stats: pstats.Stats) -> List[str]:
+    """Convert profiling stats into collapsed stacks ("frame;frame;frame microseconds"), the input of flamegraph tools.
+    cProfile only records caller/callee pairs, so the time of a function is split between its callers\
+    in proportion to the time spent under each one.
+    The number of call paths grows exponentially with the call graph, so branches taking less than\
+    MIN_STACK_SHARE of the total time are folded into their caller, and the walk stops after\
+    MAX_STACK_DEPTH frames or MAX_STACKS stacks.
+
+    Args:
+        stats (pstats.Stats): stats of a single profiling run.
+
+    Returns:
+        List[str]: one line per stack.
+    """
+    callees = dict()
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, caller_stats in callers.items():
+            # Cumulative time spent in `func` when called from `caller`
+            callees.setdefault(caller, dict())[func] = caller_stats[3]
+
+    # Start from the functions without callers (i.e., the top of the stack)
+    roots = [func for func, func_stats in stats.stats.items() if not func_stats[4]]
+    min_share = sum(stats.stats[func][3] for func in roots) * MIN_STACK_SHARE
+
+    stacks = dict()
+    funcs_in_stack = set()
+
+    def walk(func: Tuple, stack: str, time_share: float, depth: int) -> None:
+        total_time, own_time = stats.stats[func][3], stats.stats[func][2]
+        if total_time <= 0:
+            return
+        ratio = min(time_share / total_time, 1)
+        stack = f"{stack};{_frame_name(func)}" if stack else _frame_name(func)
+
+        # Time of the callees that are not walked stays in this frame
+        folded_time = 0
+        funcs_in_stack.add(func)
+        for callee, callee_time in callees.get(func, dict()).items():
+            callee_share = callee_time * ratio
+            # Skip recursive calls, their time is already included in the caller
+            if callee in funcs_in_stack:
+                continue
+            if (callee_share < min_share) or (depth >= MAX_STACK_DEPTH) or (len(stacks) >= MAX_STACKS):
+                folded_time += callee_share
+                continue
+            walk(callee, stack, callee_share, depth + 1)
+        funcs_in_stack.discard(func)
+
+        stacks[stack] = stacks.get(stack, 0) + own_time * ratio + folded_time
+
+    for func in roots:
+        walk(func, "", stats.stats[func][3], 1)
+
+    return [
+        f"{stack} {int(seconds * 1e6)}"
+        for stack, seconds in stacks.items()
+        if int(seconds * 1e6) > 0
+    ]
+
+
+def _dump_profile(name: str, profiler: cProfile.Profile) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    base_path = os.path.join(PROFILE_DIR, f"{name}-{timestamp}-{os.getpid()}")
+
+    # Raw dump, to load with pstats or snakeviz
+    profiler.dump_stats(f"{base_path}.prof")
+
+    stats = pstats.Stats(profiler)
+    # Human readable summary of the slowest calls
+    with open(f"{base_path}.txt", "w") as f:
+        stats.stream = f
+        stats.sort_stats("cumulative").print_stats(50)
+
+    # Collapsed stacks for flamegraph.pl or speedscope
+    with open(f"{base_path}.collapsed.txt", "w") as f:
+        f.write("\n".join(collapse_stats(stats)) + "\n")
+
+    logging.info(f"{datetime.datetime.now()}: Saved profile of {name} to {base_path}.prof")
+
+
+def profiled(name: str, sample: bool = True) -> Callable:
+    """Decorator to profile a sample of the calls of a function and save the results to PROFILE_DIR.
+    When profiling is off, the cost is a single check per call.
+
+    Args:
+        name (str): name used for the dump files.
+        sample (bool): whether to profile only every PROFILE_EVERY-th call. Use False for functions\
+            that run once per process, like the scraper.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (PROFILE_ENABLED or _forced_calls) or not _should_profile(name, sample):
+                return func(*args, **kwargs)
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Only one profiler can be active at a time (e.g. renders in parallel threads)
+                logging.warning(f"{datetime.datetime.now()}: Could not profile {name}, another profiler is already active")
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                try:
+                    _dump_profile(name, profiler)
+                except Exception:
+                    # Profiling must never break the render itself
+                    logging.exception(f"{datetime.datetime.now()}: Could not save profile of {name}")
+
+        return wrapper
+
+    return decorator
\ No newline at end of file
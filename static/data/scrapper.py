@@ -8,6 +8,8 @@ import pandas as pd
 from typing import Dict, SupportsBytes, Tuple
 from colorthief import ColorThief
 import logging
+import os
+import sys
 logging.basicConfig(level=logging.INFO)
 
 
@@ -224,4 +226,8 @@ def main():
 
 if __name__ == "__main__":
     BASE_URL = "https://alchemystars.fandom.com"
-    main()
+
+    # The profiling module lives at the root of the repository
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    import profiling
+    profiling.profiled("scrapper", sample=False)(main)()
@@ -0,0 +1,82 @@
+import threading
+import time
+import zipfile
+from io import BytesIO
+import pandas as pd
+import pytest
+import gen_wallpaper
+
+
+def art_info(name: str, align: str = "Right", art: str = None) -> dict:
+    info = {"Name": name, "Url": f"https://example.com/{name}.png", "CharAlign": align}
+    if art:
+        info["Art"] = art
+    return info
+
+
+def test_zip_entry_name():
+    assert gen_wallpaper.zip_entry_name(art_info("Alice", art="Ascension 3")) == "Alice - Ascension 3 - Right.png"
+    # The art is optional
+    assert gen_wallpaper.zip_entry_name(art_info("Alice", "Left")) == "Alice - Left.png"
+
+
+def test_wallpaper_zip_gen_names_and_failures(monkeypatch):
+    def fake_render(info):
+        if info["Name"] == "Broken":
+            raise ValueError("bad image")
+        return info["Name"].encode()
+
+    monkeypatch.setattr(gen_wallpaper, "render_wallpaper_png", fake_render)
+
+    zip_bytes = BytesIO()
+    failed = gen_wallpaper.wallpaper_zip_gen(
+        [art_info("X"), art_info("Broken"), art_info("X"), art_info("X", "Left")],
+        zip_bytes,
+        max_workers=1
+    )
+
+    # Failed renders are reported and left out of the archive
+    assert failed == ["Broken - Right.png"]
+    with zipfile.ZipFile(zip_bytes) as archive:
+        assert archive.namelist() == ["X - Right.png", "X - Right (2).png", "X - Left.png"]
+        assert archive.read("X - Right (2).png") == b"X"
+
+
+@pytest.mark.timeout(60)
+def test_wallpaper_zip_gen_bounds_renders_in_flight(monkeypatch):
+    lock = threading.Lock()
+    running = [0]
+    max_running = [0]
+
+    def fake_render(info):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return b"png"
+
+    monkeypatch.setattr(gen_wallpaper, "render_wallpaper_png", fake_render)
+
+    zip_bytes = BytesIO()
+    arts_info = [art_info(f"Char{i}") for i in range(30)]
+    assert gen_wallpaper.wallpaper_zip_gen(arts_info, zip_bytes, max_workers=3) == list()
+
+    assert max_running[0] <= 3
+    with zipfile.ZipFile(zip_bytes) as archive:
+        assert len(archive.namelist()) == 30
+
+
+def test_get_art_urls():
+    char_data = pd.DataFrame([
+        {"Name": "Alice", "Ascension0": "a0.png", "Ascension3": None, "Skin": "Skin1", "SkinUrl": "s1.png"},
+        {"Name": "Alice", "Ascension0": "a0.png", "Ascension3": None, "Skin": "Skin2", "SkinUrl": "s2.png"}
+    ])
+
+    assert gen_wallpaper.get_art_urls(char_data, ["Ascension 0", "Ascension 3", "Skins"]) == {
+        "Ascension 0": "a0.png",
+        "Skin1": "s1.png",
+        "Skin2": "s2.png"
+    }
+    assert gen_wallpaper.get_art_urls(char_data, ["Ascension 3"]) == dict()
\ No newline at end of file
@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+import pytest
+import profiling
+
+
+def layered_call_graph(layers: int, width: int, own_time: float = 0.001) -> SimpleNamespace:
+    """Build pstats-like stats where every function calls every function of the next layer,\
+    i.e., `width ** layers` distinct call paths.
+    """
+    stats = dict()
+    funcs = [[("app.py", layer * width + i, f"func_{layer}_{i}") for i in range(width)] for layer in range(layers)]
+    root = ("app.py", 0, "root")
+
+    # Cumulative time of a function of each layer, from the bottom up
+    total_times = [0] * layers
+    total_times[-1] = own_time
+    for layer in range(layers - 2, -1, -1):
+        total_times[layer] = own_time + total_times[layer + 1]
+
+    for layer in range(layers):
+        callers = [root] if layer == 0 else funcs[layer - 1]
+        for func in funcs[layer]:
+            # The time of the function is split evenly between its callers
+            edge_time = total_times[layer] / len(callers)
+            stats[func] = (1, 1, own_time, total_times[layer], {
+                caller: (1, 1, own_time / len(callers), edge_time) for caller in callers
+            })
+    stats[root] = (1, 1, own_time, own_time + width * total_times[0], dict())
+
+    return SimpleNamespace(stats=stats)
+
+
+@pytest.mark.timeout(60)
+def test_collapse_stats_large_call_graph():
+    stats = layered_call_graph(layers=30, width=40)
+
+    lines = profiling.collapse_stats(stats)
+    assert 0 < len(lines) <= profiling.MAX_STACKS
+    # Folding small branches into their caller keeps the total time
+    total_us = sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+    root_us = stats.stats[("app.py", 0, "root")][3] * 1e6
+    assert abs(total_us - root_us) / root_us < 0.01
+
+
+def test_collapse_stats_simple_call_graph():
+    root = ("app.py", 1, "root")
+    child = ("app.py", 2, "child")
+    stats = SimpleNamespace(stats={
+        root: (1, 1, 0.25, 1.0, dict()),
+        child: (1, 1, 0.75, 0.75, {root: (1, 1, 0.75, 0.75)})
+    })
+
+    assert sorted(profiling.collapse_stats(stats)) == [
+        "root (app.py:1) 250000",
+        "root (app.py:1);child (app.py:2) 750000"
+    ]
+
+
+def test_should_profile_sampling(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_EVERY", 10)
+    monkeypatch.setattr(profiling, "_call_counts", dict())
+
+    # Sampled functions are only profiled every PROFILE_EVERY-th call
+    assert [profiling._should_profile("render", sample=True) for _ in range(10)] == [False] * 9 + [True]
+    # Functions that run once per process are always profiled
+    assert profiling._should_profile("scrapper", sample=False)
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_EVERY", 1)
+    monkeypatch.setattr(profiling, "_call_counts", dict())
+    monkeypatch.setattr(profiling, "_forced_calls", 0)
+    return tmp_path
+
+
+def dump_suffixes(profile_dir) -> list:
+    return sorted(path.name.split(".", 1)[1] for path in profile_dir.iterdir())
+
+
+def test_profiled_writes_dumps(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+
+    @profiling.profiled("render")
+    def render(n):
+        return sorted(range(n), reverse=True)[0]
+
+    assert render(1000) == 999
+    assert dump_suffixes(profile_dir) == ["collapsed.txt", "prof", "txt"]
+
+
+def test_profiled_disabled(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", False)
+
+    def no_profiler():
+        raise AssertionError("the profiler should not be created")
+
+    monkeypatch.setattr(profiling.cProfile, "Profile", no_profiler)
+
+    @profiling.profiled("render")
+    def render(n):
+        return n * 2
+
+    assert render(21) == 42
+    assert dump_suffixes(profile_dir) == list()
+
+
+def test_request_profile(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", False)
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+
+    assert not profiling.request_profile("wrong")
+    assert profiling._forced_calls == 0
+    assert profiling.request_profile("secret")
+
+    @profiling.profiled("render")
+    def render(n):
+        return n * 2
+
+    # A single forced call is used up by a single wrapped call
+    assert render(1) == 2
+    assert render(2) == 4
+    assert dump_suffixes(profile_dir) == ["collapsed.txt", "prof", "txt"]
+
+
+def test_request_profile_without_token(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", None)
+    monkeypatch.setattr(profiling, "_forced_calls", 0)
+
+    assert not profiling.request_profile("secret")
+    assert profiling._forced_calls == 0
+
+
+def test_read_profile_every(monkeypatch):
+    monkeypatch.setenv("WALLPAPER_PROFILE_EVERY", "5")
+    assert profiling._read_profile_every() == 5
+
+    # A bad value falls back on the default instead of breaking the import
+    monkeypatch.setenv("WALLPAPER_PROFILE_EVERY", "ten")
+    assert profiling._read_profile_every() == 10
\ No newline at end of file